@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
-import os, time, threading, re, json
+import os, time, threading, re, json, ctypes, select, heapq, struct
+from array import array
 from collections import deque, defaultdict
 from datetime import datetime
 from urllib.request import urlopen, Request
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from prometheus_client import Counter, Gauge, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest
+from functools import lru_cache
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -19,11 +21,29 @@ STEAM_APPLIST_TTL  = 7200    # AppList alle 2h neu laden
 RETRY_UNKNOWN_TTL  = 7200    # "Depot XXXXX"-Eintraege nach 2h nochmal versuchen
 NGINX_CACHE_PATH   = os.getenv("NGINX_CACHE_PATH", "")
 PREFILL_LOG_PATH   = os.getenv("PREFILL_LOG_PATH", "")
-_IP_RE             = re.compile(r'^\d{1,3}(\.\d{1,3}){3}$')
+_IP_RE             = re.compile(r'^\d{1,3}(?:\.\d{1,3}){3}$')
 _PF_START          = re.compile(r'Starting (.+)$')
-_PF_DL             = re.compile(r'Downloading ([\d.]+) (\w+) from (\d+) chunks')
+_PF_DL             = re.compile(r'Downloading ([\d.]+) (\w+) from \d+ chunks')
 _PF_DONE           = re.compile(r'Finished in [\d:.]+ - ([\d.]+) Mbit/s')
 _PF_DEPOT          = re.compile(r'Downloading manifest \d+ for depot (\d+)')
+_STEAM_DEPOT_RE    = re.compile(r"/depot/(\d+)/")
+_EPIC_BUILD_RE     = re.compile(r"/Builds/Org/([^/]+)/([^/]+)/")
+_BLIZZARD_TPR_RE   = re.compile(r"/tpr/([^/]+)/")
+_WSUS_FILE_RE      = re.compile(
+    r"/filestreamingservice/files/(?P<file_id>[0-9a-f-]{36})"
+    r"|/(?:msdownload|v11|update)/(?:[^/]*/)+?(?P<file_name>[^/?]+\.(?:cab|exe|msu|msp|psf))",
+    re.IGNORECASE,
+)
+# Upstream-Cache-Status (vom Parser bereits in Grossbuchstaben) → Hit/Miss
+_HIT_STATUSES      = frozenset(("HIT", "STALE"))
+_MISS_STATUSES     = frozenset(("MISS", "BYPASS", "EXPIRED"))
+_HIT_CODES         = frozenset((200, 206, 304))  # Fallback bei "-" o.ae.
+# Haeufige HTTP-Status als Lookup statt int()-Parse je Log-Zeile
+_STATUS_CODES      = {str(c): c for c in (200, 204, 206, 301, 302, 304, 400, 403, 404, 416, 499, 500, 502, 503, 504)}
+LOG_READ_CHUNK     = 1 << 20  # Bytes pro read() auf das Access-Log (1 MB)
+RATE_WINDOW        = 60       # Sekunden-Fenster fuer active_connections/Download-Rate
+STATS_INTERVAL     = int(os.getenv("STATS_INTERVAL", "30"))  # Sekunden zwischen update_stats()
+LOG_WAIT_TIMEOUT   = 5        # max. Wartezeit auf inotify-Events, danach trotzdem lesen
 HISTORY_INTERVAL   = int(os.getenv("HISTORY_INTERVAL", "60"))  # Sekunden pro Snapshot
 HISTORY_MAX        = 1440  # 24h bei 1-min-Intervall
 
@@ -78,6 +98,52 @@ def _parse_prefill_log(lines, state):
     }
     return status, new_depots
 
+# ── inotify (Linux) fuer das Access-Log ──────────────────────────────────────
+_IN_MODIFY   = 0x00000002
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE   = 0x00000100
+
+
+def _inotify_open(directory):
+    """Liefert einen inotify-FD, der bei Schreibzugriffen und neuen Dateien in
+    `directory` lesbar wird, oder None (kein Linux, Watch-Limit erreicht, ...)
+    – dann bleibt es beim Polling im Sekundentakt."""
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd   = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(directory), _IN_MODIFY | _IN_MOVED_TO | _IN_CREATE) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+def _inotify_wait(fd, name, timeout):
+    """Schlaeft, bis ein Event fuer die Datei `name` im beobachteten Verzeichnis
+    eintrifft (hoechstens `timeout` Sekunden). Events fuer andere Dateien dort
+    (z.B. error.log) werden verworfen, ohne den Aufrufer zu wecken."""
+    target   = os.fsencode(name)
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+            return
+        try:
+            data = os.read(fd, 4096)
+        except BlockingIOError:
+            continue
+        # struct inotify_event { int wd; uint32 mask, cookie, len; char name[len]; }
+        pos, hit = 0, False
+        while pos + 16 <= len(data):
+            size = struct.unpack_from("iIII", data, pos)[3]
+            hit  = hit or data[pos + 16:pos + 16 + size].rstrip(b"\0") == target
+            pos += 16 + size
+        if hit:
+            return
+
 # ── Blizzard Game-Code → Name ─────────────────────────────────────────────────
 BLIZZARD_GAMES = {
     "hs":          "Hearthstone",
@@ -324,34 +390,40 @@ def resolve_epic_item(item_id, cache):
 
 
 # ── URL-Parser je CDN ─────────────────────────────────────────────────────────
+@lru_cache(maxsize=1024)
+def _is_ip_identifier(cdn):
+    # Heartbeat-/SNI-Proxy-Zeilen tragen statt eines CDN-Namens eine IP. Es gibt
+    # nur wenige verschiedene Identifier, daher das Ergebnis je Wert merken.
+    return _IP_RE.match(cdn) is not None
+
+
 def extract_game_info(r):
     cdn = r.get("cdn", "")
     url = r.get("url", "")
 
     if cdn == "steam":
-        m = re.search(r"/depot/(\d+)/", url)
+        m = _STEAM_DEPOT_RE.search(url)
         if m:
             return "steam", int(m.group(1)), None
 
     elif cdn == "epicgames":
         # Zweite Komponente ist die Catalog-Item-ID (identifiziert das Spiel),
         # erste nur die Org des Publishers
-        m = re.search(r"/Builds/Org/([^/]+)/([^/]+)/", url)
+        m = _EPIC_BUILD_RE.search(url)
         if m:
             return "epicgames", m.group(2), m.group(1)
 
     elif cdn == "blizzard":
-        m = re.search(r"/tpr/([^/]+)/", url)
+        m = _BLIZZARD_TPR_RE.search(url)
         if m:
             return "blizzard", m.group(1).lower(), None
 
     elif cdn == "wsus":
-        m = re.search(r"/filestreamingservice/files/([0-9a-f-]{36})", url, re.IGNORECASE)
+        # Ein Durchlauf fuer beide URL-Varianten (Delivery-Optimization-ID
+        # oder klassischer Dateiname); lastgroup sagt, welche getroffen hat
+        m = _WSUS_FILE_RE.search(url)
         if m:
-            return "wsus", m.group(1).lower(), None
-        m = re.search(r"/(?:msdownload|v11|update)/.*?/([^/?]+\.(?:cab|exe|msu|msp|psf))", url, re.IGNORECASE)
-        if m:
-            return "wsus", m.group(1).lower(), None
+            return "wsus", m.group(m.lastgroup).lower(), None
         return "wsus", "__wsus__", None
 
     return None
@@ -393,11 +465,20 @@ class LanCacheMonitor:
         self.prefill_bytes_hit     = 0
         self.prefill_requests_miss = 0
         self.prefill_requests_hit  = 0
-        self.recent_timestamps   = deque()  # float-Timestamps der letzten 60s (kein maxlen)
-        self.recent_bytes        = deque()  # (timestamp, bytes) für Download-Rate
+        # Ringpuffer mit einem Slot je Sekunde statt eines Eintrags pro Request;
+        # _rate_secs haelt fest, zu welcher Sekunde der Slot gerade zaehlt
+        self._rate_secs          = array("q", bytes(8 * RATE_WINDOW))
+        self._rate_reqs          = array("q", bytes(8 * RATE_WINDOW))
+        self._rate_bytes         = array("q", bytes(8 * RATE_WINDOW))
         self._download_rate_bps  = 0.0
         self.total_errors_5xx    = 0
-        self.cdn_stats           = {}
+        # CDN → fester Index in parallele Zaehler-Arrays (Requests/Hits/Bytes);
+        # es gibt nur eine Handvoll CDNs, die Arrays wachsen praktisch nie
+        self._cdn_id             = {}
+        self._cdn_names          = []
+        self._cdn_requests       = array("q")
+        self._cdn_hits           = array("q")
+        self._cdn_bytes          = array("q")
         self.total_bytes_hit     = 0
         self.total_bytes_miss    = 0
         # Nur Live-Traffic (log_ts < 300s alt) für den Verlaufs-Chart –
@@ -406,10 +487,22 @@ class LanCacheMonitor:
         self._hist_bytes_miss    = 0
         self._hist_pf_hit        = 0
         self._hist_pf_miss       = 0
-        self.history             = []
+        self.history             = deque(maxlen=HISTORY_MAX)
         self._next_snapshot      = time.time() + HISTORY_INTERVAL
 
-        self.game_stats         = defaultdict(lambda: {"bytes_hit": 0, "bytes_miss": 0, "hits": 0, "misses": 0})
+        # (cdn, game_id) → [bytes_hit, bytes_miss, hits, misses]; Liste statt
+        # innerem Dict, damit je Request nur Index-Zugriffe statt Hash-Lookups anfallen
+        self.game_stats         = {}
+        # (Counter, Label-Werte) → Zuwachs seit dem letzten flush_metrics()
+        self._pending_inc       = defaultdict(int)
+        # (Metrik, Label-Werte) → aufgeloestes labels()-Child, spart die
+        # Label-Aufloesung bei jedem Flush
+        self._label_children    = {}
+        # Serialisierte /metrics-Antwort; wird nur neu erzeugt, wenn sich seit
+        # dem letzten Scrape etwas geaendert hat (flush_metrics/update_stats)
+        self._metrics_cache     = None
+        self._metrics_dirty     = True
+        self._metrics_lock      = threading.Lock()
         self.steam_cache        = load_steam_cache()
         self.name_resolve_queue = set()
         self.lock               = threading.Lock()
@@ -435,57 +528,60 @@ class LanCacheMonitor:
     # ── Log-Parsing ───────────────────────────────────────────────────────────
 
     def parse_lancache_log_line(self, line):
-        pattern = (
-            r'\[([^\]]+)\] (\S+) / - - - \[([^\]]+)\] '
-            r'"([^"]+)" (\d+) (\d+) '
-            r'"([^"]*)" "([^"]*)" "([^"]*)" "([^"]*)" "([^"]*)"'
-        )
-        m = re.match(pattern, line.strip())
-        if not m:
+        # Format: [cdn] ip / - - - [ts] "request" status bytes "referer" "ua" "hit_status" "host" "range"
+        # Split an den Anfuehrungszeichen statt Regex: die Felder liegen an festen
+        # Positionen (1 = Request, 7 = Hit-Status), der Rest per str.split().
+        # Host und Range werden nicht gebraucht und bleiben ungesplittet in parts[8].
+        parts = line.split('"', 8)
+        if len(parts) < 9 or not parts[1]:
+            return None
+        head = parts[0].split()  # ['[cdn]', ip, '/', '-', '-', '-', '[dd/Mon/yyyy:hh:mm:ss', '+zzzz]']
+        tail = parts[2].split()  # [status, bytes]
+        if len(head) != 8 or len(tail) != 2 or head[0][0] != "[" or head[6][0] != "[":
             return None
         try:
-            parts = m.group(4).split(" ")
+            req = parts[1].split(" ")
             return {
-                "cdn":        m.group(1).lower(),
-                "ip":         m.group(2),
-                "method":     parts[0] if parts else "GET",
-                "url":        parts[1] if len(parts) > 1 else "/",
-                "status":     int(m.group(5)),
-                "bytes":      int(m.group(6)) if m.group(6).isdigit() else 0,
-                "hit_status": m.group(9),
-                "log_ts":     self._parse_log_ts(m.group(3)),
+                "cdn":        head[0][1:-1].lower(),
+                "ip":         head[1],
+                "method":     req[0] if req else "GET",
+                "url":        req[1] if len(req) > 1 else "/",
+                "status":     _STATUS_CODES.get(tail[0]) or int(tail[0]),
+                "bytes":      int(tail[1]) if tail[1].isdigit() else 0,
+                "hit_status": parts[7].upper(),
+                "log_ts":     self._parse_log_ts(f"{head[6][1:]} {head[7][:-1]}") or time.time(),
             }
         except (ValueError, IndexError):
             return None
 
     @staticmethod
+    @lru_cache(maxsize=256)
     def _parse_log_ts(raw):
+        # strptime ist der teuerste Schritt je Zeile; nginx loggt sekundengenau,
+        # viele Zeilen teilen sich also denselben Zeitstempel-String. Bei Fehlern
+        # None statt time.time(), damit kein "jetzt" im Cache landet.
         try:
             return datetime.strptime(raw, "%d/%b/%Y:%H:%M:%S %z").timestamp()
         except Exception:
-            return time.time()
-
-    def is_cache_hit(self, r):
-        s = r.get("hit_status", "").upper()
-        if s in ("HIT", "STALE"):              return True
-        if s in ("MISS", "BYPASS", "EXPIRED"): return False
-        return r.get("status", 0) in (200, 206, 304)
+            return None
 
     # ── Request verarbeiten ───────────────────────────────────────────────────
 
     def process_request(self, r):
         if not r:
             return
-        if _IP_RE.match(r.get("cdn", "")):
+        if _is_ip_identifier(r.get("cdn", "")):
             return  # Heartbeat / interne SNI-Proxy-Anfragen
+        pending = self._pending_inc
+        hs      = r.get("hit_status", "UNKNOWN")
+        hit     = hs in _HIT_STATUSES or (hs not in _MISS_STATUSES and r.get("status", 0) in _HIT_CODES)
         if r.get("ip") in self.ignore_ips:
-            self.ignored_requests.inc()
-            b   = r.get("bytes", 0)
-            hit = self.is_cache_hit(r)
-            hs  = "HIT" if hit else "MISS"
-            self.prefill_requests_counter.labels(hit_status=hs).inc()
+            pending[(self.ignored_requests, ())] += 1
+            b     = r.get("bytes", 0)
+            label = "HIT" if hit else "MISS"
+            pending[(self.prefill_requests_counter, (label,))] += 1
             if b > 0:
-                self.prefill_bytes_counter.labels(hit_status=hs).inc(b)
+                pending[(self.prefill_bytes_counter, (label,))] += b
                 if hit:
                     self.prefill_bytes_hit     += b
                     self.prefill_requests_hit  += 1
@@ -500,72 +596,103 @@ class LanCacheMonitor:
             return
         self.total_requests += 1
         cdn, method, status = r.get("cdn", "unknown"), r.get("method", "GET"), str(r.get("status", 0))
-        b, hs = r.get("bytes", 0), r.get("hit_status", "UNKNOWN")
+        b      = r.get("bytes", 0)
+        hs_hit = hs in _HIT_STATUSES
 
-        if cdn not in self.cdn_stats:
-            self.cdn_stats[cdn] = {"requests": 0, "hits": 0, "bytes": 0}
+        cid = self._cdn_id.get(cdn)
+        if cid is None:
+            cid = self._cdn_id[cdn] = len(self._cdn_names)
+            self._cdn_names.append(cdn)
+            for arr in (self._cdn_requests, self._cdn_hits, self._cdn_bytes):
+                arr.append(0)
 
-        self.requests_total.labels(status=status, method=method, cdn=cdn).inc()
+        pending[(self.requests_total, (status, method, cdn))] += 1
         if b > 0:
-            self.bytes_total.labels(cdn=cdn, hit_status=hs).inc(b)
+            pending[(self.bytes_total, (cdn, hs))] += b
             self.total_bytes_served += b
-            self.cdn_stats[cdn]["bytes"] += b
-            if hs.upper() in ("HIT", "STALE"):
+            self._cdn_bytes[cid] += b
+            if hs_hit:
                 self.total_bytes_hit  += b
             else:
                 self.total_bytes_miss += b
 
-        self.cdn_stats[cdn]["requests"] += 1
-        hit = self.is_cache_hit(r)
+        self._cdn_requests[cid] += 1
         if hit:
             self.total_hits += 1
-            self.cdn_stats[cdn]["hits"] += 1
-            self.cache_hits.labels(cdn=cdn).inc()
+            self._cdn_hits[cid] += 1
+            pending[(self.cache_hits, (cdn,))] += 1
         else:
-            self.cache_misses.labels(cdn=cdn).inc()
-
-        if self.total_requests > 0:
-            self.hit_rate.set(self.total_hits / self.total_requests)
-        cr = self.cdn_stats[cdn]["requests"]
-        if cr > 0:
-            self.hit_rate_by_cdn.labels(cdn=cdn).set(self.cdn_stats[cdn]["hits"] / cr)
+            pending[(self.cache_misses, (cdn,))] += 1
 
         log_ts = r.get("log_ts", 0)
         if time.time() - log_ts < 300:  # nur Echtzeit-Eintraege, kein Log-Replay
-            self.recent_timestamps.append(log_ts)
+            sec  = int(log_ts)
+            slot = sec % RATE_WINDOW
+            if self._rate_secs[slot] < sec:  # Slot gehoerte zu einer aelteren Sekunde
+                self._rate_secs[slot], self._rate_reqs[slot], self._rate_bytes[slot] = sec, 0, 0
+            if self._rate_secs[slot] == sec:
+                self._rate_reqs[slot]  += 1
+                self._rate_bytes[slot] += b
             if b > 0:
-                self.recent_bytes.append((log_ts, b))
-                if hs.upper() in ("HIT", "STALE"):
+                if hs_hit:
                     self._hist_bytes_hit  += b
                 else:
                     self._hist_bytes_miss += b
 
         if int(r.get("status", 0)) >= 500:
             self.total_errors_5xx += 1
-            self.errors_5xx_counter.labels(cdn=cdn).inc()
+            pending[(self.errors_5xx_counter, (cdn,))] += 1
 
         info = extract_game_info(r)
         if info:
             cdn_key, game_id, _ = info
             key = (cdn_key, game_id)
-            with self.lock:
-                if hit:
-                    self.game_stats[key]["bytes_hit"]  += b
-                    self.game_stats[key]["hits"]        += 1
-                else:
-                    self.game_stats[key]["bytes_miss"] += b
-                    self.game_stats[key]["misses"]     += 1
-                resolvable = cdn_key == "steam" or (
-                    cdn_key == "epicgames" and str(game_id) not in EPIC_CODENAMES
-                )
-                if resolvable:
-                    cache_key = f"depot_{game_id}" if cdn_key == "steam" else f"epic_{game_id}"
-                    entry = self.steam_cache.get(cache_key, {})
-                    if cache_key not in self.steam_cache or (
-                        entry.get("source") == "unknown" and
-                        time.time() >= entry.get("_retry_after", 0)
-                    ):
-                        self.name_resolve_queue.add((cdn_key, game_id))
+            # Nur der Log-Thread schreibt game_stats; der Lock ist nur noetig,
+            # wenn ein neuer Schluessel angelegt wird (get_games_list iteriert
+            # das Dict) oder die Resolver-Queue befuellt wird
+            stats = self.game_stats.get(key)
+            if stats is None:
+                with self.lock:
+                    stats = self.game_stats[key] = [0, 0, 0, 0]
+            if hit:
+                stats[0] += b
+                stats[2] += 1
+            else:
+                stats[1] += b
+                stats[3] += 1
+            resolvable = cdn_key == "steam" or (
+                cdn_key == "epicgames" and str(game_id) not in EPIC_CODENAMES
+            )
+            if resolvable and key not in self.name_resolve_queue:
+                cache_key = f"depot_{game_id}" if cdn_key == "steam" else f"epic_{game_id}"
+                entry = self.steam_cache.get(cache_key, {})
+                if cache_key not in self.steam_cache or (
+                    entry.get("source") == "unknown" and
+                    time.time() >= entry.get("_retry_after", 0)
+                ):
+                    with self.lock:
+                        self.name_resolve_queue.add(key)
+
+    def flush_metrics(self):
+        """Uebertraegt die in process_request() gesammelten Zuwaechse in die
+        Prometheus-Counter – ein inc() je Label-Kombination und Lese-Block
+        statt je Request – und setzt die Hit-Rate-Gauges."""
+        for key, n in self._pending_inc.items():
+            self._child(*key).inc(n)
+        self._pending_inc.clear()
+        if self.total_requests > 0:
+            self.hit_rate.set(self.total_hits / self.total_requests)
+        for cid, cdn in enumerate(self._cdn_names):
+            if self._cdn_requests[cid] > 0:
+                self._child(self.hit_rate_by_cdn, (cdn,)).set(self._cdn_hits[cid] / self._cdn_requests[cid])
+        self._metrics_dirty = True
+
+    def _child(self, metric, labels):
+        key   = (metric, labels)
+        child = self._label_children.get(key)
+        if child is None:
+            child = self._label_children[key] = metric.labels(*labels) if labels else metric
+        return child
 
     # ── Name-Aufloesung ───────────────────────────────────────────────────────
 
@@ -642,108 +769,143 @@ class LanCacheMonitor:
     # ── Log-Monitor & Stats ───────────────────────────────────────────────────
 
     def monitor_logs(self):
-        last_pos   = 0
-        last_inode = None
+        """Liest das Access-Log und fuehrt alle STATS_INTERVAL Sekunden
+        update_stats() aus – beides in diesem Thread, per Deadline statt eines
+        eigenen Stats-Threads mit sleep()."""
+        fd, inode, buf = None, None, b""
+        watch      = None
+        next_stats = time.monotonic()
+        parse, process = self.parse_lancache_log_line, self.process_request
         while True:
+            if time.monotonic() >= next_stats:
+                self.update_stats()
+                next_stats = time.monotonic() + STATS_INTERVAL
             try:
-                if os.path.exists(self.log_path):
-                    st        = os.stat(self.log_path)
-                    cur_inode = st.st_ino
-                    cur_size  = st.st_size
-                    if last_inode is not None and cur_inode != last_inode:
+                # Datei bleibt offen; ein read() je LOG_READ_CHUNK statt einem pro Zeile.
+                # Die angefangene letzte Zeile bleibt im Puffer, bis nginx sie
+                # fertig geschrieben hat.
+                chunk = os.read(fd, LOG_READ_CHUNK) if fd is not None else b""
+                if chunk:
+                    # Alle vollstaendigen Zeilen mit einem decode() am Stueck
+                    # umwandeln statt jede Zeile einzeln
+                    data = buf + chunk
+                    cut  = data.rfind(b"\n") + 1
+                    buf  = data[cut:]
+                    for line in data[:cut].decode("utf-8", "replace").split("\n"):
+                        # Jede gueltige Zeile beginnt mit "[cacheidentifier]";
+                        # Leerzeilen und Fragmente gar nicht erst parsen
+                        if line[:1] == "[":
+                            process(parse(line))
+                    self.flush_metrics()
+                    continue
+                # Dateiende erreicht (oder noch nicht geoeffnet) → Rotation pruefen
+                if not os.path.exists(self.log_path):
+                    if fd is None or watch is None:
+                        logger.warning(f"Log-Datei {self.log_path} nicht gefunden")
+                        time.sleep(10)
+                        continue
+                    # Alte Datei wegrotiert, neue noch nicht angelegt: alten FD
+                    # weiterlesen und auf IN_CREATE/IN_MOVED_TO warten
+                else:
+                    st = os.stat(self.log_path)
+                    if fd is not None and st.st_ino != inode:
                         logger.info("Log-Datei rotiert (neue Inode) – lese von vorn")
-                        last_pos = 0
-                    elif cur_size < last_pos:
+                        os.close(fd)
+                        fd = None
+                    elif fd is not None and st.st_size < os.lseek(fd, 0, os.SEEK_CUR):
                         logger.info("Log-Datei geleert/gekürzt – lese von vorn")
-                        last_pos = 0
-                    last_inode = cur_inode
-                    with open(self.log_path, "r") as f:
-                        f.seek(last_pos)
-                        for line in f:
-                            if line.strip():
-                                self.process_request(self.parse_lancache_log_line(line))
-                        last_pos = f.tell()
-                else:
-                    logger.warning(f"Log-Datei {self.log_path} nicht gefunden")
-                    time.sleep(10)
+                        os.lseek(fd, 0, os.SEEK_SET)
+                        buf = b""
+                        continue
+                if fd is None:
+                    fd    = os.open(self.log_path, os.O_RDONLY)
+                    inode = os.fstat(fd).st_ino
+                    buf   = b""
+                    if watch is None:
+                        # Verzeichnis statt Datei beobachten, damit der Watch die
+                        # Log-Rotation (neue Datei) ueberlebt
+                        watch = _inotify_open(os.path.dirname(self.log_path) or ".")
+                        if watch is not None:
+                            logger.info("Log-Ueberwachung per inotify aktiv")
+                    continue
             except Exception as e:
                 logger.error(f"Fehler beim Lesen der Log-Datei: {e}")
                 time.sleep(5)
-            time.sleep(1)
+                continue
+            # Nicht ueber die naechste Stats-Deadline hinaus schlafen
+            timeout = max(0.0, min(LOG_WAIT_TIMEOUT, next_stats - time.monotonic()))
+            if watch is not None:
+                _inotify_wait(watch, os.path.basename(self.log_path), timeout)
+            else:
+                time.sleep(min(1, timeout))
 
     def update_stats(self):
-        while True:
-            try:
-                self.uptime_seconds.set(time.time() - self.start_time)
-                cutoff = time.time() - 60
-                while self.recent_timestamps and self.recent_timestamps[0] < cutoff:
-                    self.recent_timestamps.popleft()
-                self.active_connections.set(len(self.recent_timestamps))
-                while self.recent_bytes and self.recent_bytes[0][0] < cutoff:
-                    self.recent_bytes.popleft()
-                self._download_rate_bps = sum(b for _, b in self.recent_bytes) / 60
-                self.download_rate.set(self._download_rate_bps)
-                tb = int(self.total_bytes_served)
-                self.bytes_served_total.set(tb)
-                logger.info(
-                    f"Stats - Requests: {self.total_requests}, Hits: {self.total_hits}, "
-                    f"Hit Rate: {(self.total_hits / max(self.total_requests, 1)) * 100:.1f}%, "
-                    f"Bytes: {tb / (1024**3):.1f} GB"
-                )
-                now = time.time()
-                if now >= self._next_snapshot:
-                    self.history.append({
-                        "ts":         int(now),
-                        "bytes_hit":  self._hist_bytes_hit + self._hist_pf_hit,
-                        "bytes_miss": self._hist_bytes_miss + self._hist_pf_miss,
-                        "requests":   self.total_requests,
-                        "hits":       self.total_hits,
-                    })
-                    if len(self.history) > HISTORY_MAX:
-                        self.history.pop(0)
-                    self._next_snapshot = now + HISTORY_INTERVAL
-                if NGINX_CACHE_PATH:
-                    try:
-                        st    = os.statvfs(NGINX_CACHE_PATH)
-                        total = st.f_blocks * st.f_frsize
-                        free  = st.f_bavail * st.f_frsize
-                        self.disk_used_gauge.set(total - free)
-                        self.disk_available_gauge.set(free)
-                        self.disk_total_gauge.set(total)
-                    except Exception as de:
-                        logger.warning(f"Disk-Stats nicht lesbar ({NGINX_CACHE_PATH}): {de}")
-                if PREFILL_LOG_PATH:
-                    try:
-                        st        = os.stat(PREFILL_LOG_PATH)
-                        cur_inode = st.st_ino
-                        cur_size  = st.st_size
-                        if self._prefill_inode is not None and cur_inode != self._prefill_inode:
-                            logger.info("Prefill-Log rotiert (neue Inode) – lese von vorn")
-                            self._prefill_pos = 0
-                        elif cur_size < self._prefill_pos:
-                            logger.info("Prefill-Log geleert/gekuerzt – lese von vorn")
-                            self._prefill_pos = 0
-                        self._prefill_inode = cur_inode
-                        if self._prefill_pos == 0:
-                            self._prefill_state = {
-                                "games": {}, "last_name": None,
-                                "game": None, "size": None, "speed": None, "active": False,
-                            }
-                        with open(PREFILL_LOG_PATH, "r", errors="replace") as f:
-                            f.seek(self._prefill_pos)
-                            new_lines = f.read().splitlines()
-                            self._prefill_pos = f.tell()
-                        if new_lines:
-                            self.prefill_status, new_depots = _parse_prefill_log(
-                                new_lines, self._prefill_state
-                            )
-                            if new_depots:
-                                self._merge_prefill_depots(new_depots)
-                    except Exception as pe:
-                        logger.warning(f"Prefill-Log nicht lesbar ({PREFILL_LOG_PATH}): {pe}")
-            except Exception as e:
-                logger.error(f"Fehler beim Aktualisieren: {e}")
-            time.sleep(30)
+        try:
+            self.uptime_seconds.set(time.time() - self.start_time)
+            cutoff = int(time.time()) - RATE_WINDOW
+            live   = [i for i, sec in enumerate(self._rate_secs) if sec > cutoff]
+            self.active_connections.set(sum(self._rate_reqs[i] for i in live))
+            self._download_rate_bps = sum(self._rate_bytes[i] for i in live) / RATE_WINDOW
+            self.download_rate.set(self._download_rate_bps)
+            tb = int(self.total_bytes_served)
+            self.bytes_served_total.set(tb)
+            logger.info(
+                f"Stats - Requests: {self.total_requests}, Hits: {self.total_hits}, "
+                f"Hit Rate: {(self.total_hits / max(self.total_requests, 1)) * 100:.1f}%, "
+                f"Bytes: {tb / (1024**3):.1f} GB"
+            )
+            now = time.time()
+            if now >= self._next_snapshot:
+                self.history.append({
+                    "ts":         int(now),
+                    "bytes_hit":  self._hist_bytes_hit + self._hist_pf_hit,
+                    "bytes_miss": self._hist_bytes_miss + self._hist_pf_miss,
+                    "requests":   self.total_requests,
+                    "hits":       self.total_hits,
+                })
+                self._next_snapshot = now + HISTORY_INTERVAL
+            if NGINX_CACHE_PATH:
+                try:
+                    st    = os.statvfs(NGINX_CACHE_PATH)
+                    total = st.f_blocks * st.f_frsize
+                    free  = st.f_bavail * st.f_frsize
+                    self.disk_used_gauge.set(total - free)
+                    self.disk_available_gauge.set(free)
+                    self.disk_total_gauge.set(total)
+                except Exception as de:
+                    logger.warning(f"Disk-Stats nicht lesbar ({NGINX_CACHE_PATH}): {de}")
+            if PREFILL_LOG_PATH:
+                try:
+                    st        = os.stat(PREFILL_LOG_PATH)
+                    cur_inode = st.st_ino
+                    cur_size  = st.st_size
+                    if self._prefill_inode is not None and cur_inode != self._prefill_inode:
+                        logger.info("Prefill-Log rotiert (neue Inode) – lese von vorn")
+                        self._prefill_pos = 0
+                    elif cur_size < self._prefill_pos:
+                        logger.info("Prefill-Log geleert/gekuerzt – lese von vorn")
+                        self._prefill_pos = 0
+                    self._prefill_inode = cur_inode
+                    if self._prefill_pos == 0:
+                        self._prefill_state = {
+                            "games": {}, "last_name": None,
+                            "game": None, "size": None, "speed": None, "active": False,
+                        }
+                    with open(PREFILL_LOG_PATH, "r", errors="replace") as f:
+                        f.seek(self._prefill_pos)
+                        new_lines = f.read().splitlines()
+                        self._prefill_pos = f.tell()
+                    if new_lines:
+                        self.prefill_status, new_depots = _parse_prefill_log(
+                            new_lines, self._prefill_state
+                        )
+                        if new_depots:
+                            self._merge_prefill_depots(new_depots)
+                except Exception as pe:
+                    logger.warning(f"Prefill-Log nicht lesbar ({PREFILL_LOG_PATH}): {pe}")
+        except Exception as e:
+            logger.error(f"Fehler beim Aktualisieren: {e}")
+        self._metrics_dirty = True
 
     # ── Spiele-Liste ──────────────────────────────────────────────────────────
 
@@ -755,7 +917,7 @@ class LanCacheMonitor:
             wsus_files   = []
             other_games  = []
 
-            for (cdn, game_id), stats in self.game_stats.items():
+            for (cdn, game_id), (bytes_hit, bytes_miss, hits, misses) in self.game_stats.items():
                 if cdn_filter and cdn != cdn_filter:
                     continue
 
@@ -767,31 +929,29 @@ class LanCacheMonitor:
                             "depots": [], "bytes_hit": 0, "bytes_miss": 0, "hits": 0, "misses": 0,
                         }
                     steam_groups[app_id]["depots"].append(game_id)
-                    steam_groups[app_id]["bytes_hit"]  += stats["bytes_hit"]
-                    steam_groups[app_id]["bytes_miss"] += stats["bytes_miss"]
-                    steam_groups[app_id]["hits"]       += stats["hits"]
-                    steam_groups[app_id]["misses"]     += stats["misses"]
+                    steam_groups[app_id]["bytes_hit"]  += bytes_hit
+                    steam_groups[app_id]["bytes_miss"] += bytes_miss
+                    steam_groups[app_id]["hits"]       += hits
+                    steam_groups[app_id]["misses"]     += misses
 
                 elif cdn == "wsus":
-                    wsus_total["bytes_hit"]  += stats["bytes_hit"]
-                    wsus_total["bytes_miss"] += stats["bytes_miss"]
-                    wsus_total["hits"]       += stats["hits"]
-                    wsus_total["misses"]     += stats["misses"]
+                    wsus_total["bytes_hit"]  += bytes_hit
+                    wsus_total["bytes_miss"] += bytes_miss
+                    wsus_total["hits"]       += hits
+                    wsus_total["misses"]     += misses
                     if game_id != "__wsus__":
                         _, name, source = self.resolve_name(cdn, game_id)
                         wsus_files.append({
                             "cdn": "wsus", "app_id": game_id, "name": name, "source": source,
-                            "depots": [], "bytes_hit": stats["bytes_hit"],
-                            "bytes_miss": stats["bytes_miss"],
-                            "hits": stats["hits"], "misses": stats["misses"],
+                            "depots": [], "bytes_hit": bytes_hit, "bytes_miss": bytes_miss,
+                            "hits": hits, "misses": misses,
                         })
                 else:
                     _, name, source = self.resolve_name(cdn, game_id)
                     other_games.append({
                         "cdn": cdn, "app_id": str(game_id), "name": name, "source": source,
-                        "depots": [], "bytes_hit": stats["bytes_hit"],
-                        "bytes_miss": stats["bytes_miss"],
-                        "hits": stats["hits"], "misses": stats["misses"],
+                        "depots": [], "bytes_hit": bytes_hit, "bytes_miss": bytes_miss,
+                        "hits": hits, "misses": misses,
                     })
 
             wsus_entries = []
@@ -807,14 +967,25 @@ class LanCacheMonitor:
                 g["depot_count"] = len(g["depots"])
                 g["depots"]      = sorted(g["depots"]) if g["depots"] else []
 
+            if limit < len(result):
+                # Top-N ohne die komplette Liste zu sortieren (z.B. ?limit=10)
+                return heapq.nlargest(limit, result, key=lambda x: x["bytes_hit"])
             result.sort(key=lambda x: x["bytes_hit"], reverse=True)
-            return result[:limit]
+            return result
 
     # ── HTTP Handler ──────────────────────────────────────────────────────────
 
+    def metrics_output(self):
+        with self._metrics_lock:
+            # Flag vor dem Erzeugen zuruecksetzen: Aenderungen waehrend
+            # generate_latest() markieren den Cache gleich wieder als veraltet
+            if self._metrics_dirty or self._metrics_cache is None:
+                self._metrics_dirty = False
+                self._metrics_cache = generate_latest(self.registry)
+            return self._metrics_cache
+
     def create_http_handler(self):
-        registry = self.registry
-        monitor  = self
+        monitor = self
 
         class MetricsHandler(BaseHTTPRequestHandler):
             def do_GET(self):
@@ -827,7 +998,7 @@ class LanCacheMonitor:
                             params[k] = v
 
                 if path == "/metrics":
-                    out = generate_latest(registry)
+                    out = monitor.metrics_output()
                     self.send_response(200)
                     self.send_header("Content-Type", CONTENT_TYPE_LATEST)
                     self.send_header("Content-Length", str(len(out)))
@@ -906,8 +1077,10 @@ class LanCacheMonitor:
 
     def run(self):
         handler = self.create_http_handler()
-        httpd   = HTTPServer(("0.0.0.0", self.port), handler)
-        for target in [self.monitor_logs, self.update_stats, self.resolve_names_worker, applist_refresh_worker]:
+        # Ein Thread je Anfrage: ein langsamer /depots-Aufruf (Dashboard) blockiert
+        # so keinen parallelen Prometheus-Scrape
+        httpd   = ThreadingHTTPServer(("0.0.0.0", self.port), handler)
+        for target in [self.monitor_logs, self.resolve_names_worker, applist_refresh_worker]:
             threading.Thread(target=target, daemon=True).start()
         logger.info(f"HTTP Server gestartet auf Port {self.port}")
         httpd.serve_forever()